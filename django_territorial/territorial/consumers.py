@@ -1,14 +1,30 @@
 from channels.generic.websocket import AsyncWebsocketConsumer
 import asyncio
+import heapq
+import json
 from loguru import logger
 import traceback
 import time
-import zlib
 
 import numpy as np
-from territorial.models import MapMessage, SquareInfoMessage, SquareInfo, GridUpdateMessage
+import zstandard as zstd
+from pydantic import TypeAdapter
+from territorial.models import SquareInfo
 from territorial.services.game import Game
 from collections import defaultdict
+from weakref import WeakSet
+
+SQUARE_INFO_ADAPTER = TypeAdapter(SquareInfo)
+
+# One-byte tags prefixed to binary frames so the client can dispatch on them
+MAP_FRAME = b"\x01"
+GRID_UPDATE_FRAME = b"\x02"
+GRID_DELTA_FRAME = b"\x03"
+SQUARE_INFO_FRAME = b"\x04"
+PALETTE_FRAME = b"\x05"
+
+# Wire layout of one changed pixel in a delta frame
+DELTA_DTYPE = np.dtype([("y", "<u2"), ("x", "<u2"), ("id", "u1")])
 
 
 class SquareConsumer(AsyncWebsocketConsumer):
@@ -22,109 +38,190 @@ class SquareConsumer(AsyncWebsocketConsumer):
         "grid_update": 0.2,
         "neighbors": 2.0,
     }
-
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.execution_times = defaultdict(list)
-        self.LOG_INTERVAL = 60  # Log average execution times every 60 seconds
+    KEYFRAME_INTERVAL = 10.0  # Seconds between full-grid frames
+    BROADCAST_TIMEOUT = 0.15  # Seconds before a client send is considered stuck
+    LOG_INTERVAL = 60  # Log average execution times every 60 seconds
+
+    # One simulation shared by every connected client. A WeakSet so consumers that
+    # die without a clean disconnect cannot keep the broadcast list alive
+    game = None
+    connected_clients = WeakSet()
+    tasks = []
+    execution_times = defaultdict(list)
+    compressor = zstd.ZstdCompressor(level=1)
+    prev_grid = None
+    # Double buffer for the uint8 downcast: the frame under construction and
+    # the keyframe referenced by prev_grid, so no allocation per frame
+    idx_buffers = None
+    last_keyframe_time = 0.0
+    square_info_cache = {}  # id -> ((resources, center_of_mass), serialized fragment)
 
     async def connect(self):
         await self.accept()
         logger.info("WebSocket connection established")
-        self.game = Game()
+        SquareConsumer.connected_clients.add(self)
+        if SquareConsumer.game is None:
+            SquareConsumer.game = Game()
+            SquareConsumer.tasks = self.create_background_tasks()
         await self.send_map()
-        self.tasks = self.create_background_tasks()
 
     async def disconnect(self, close_code):
         logger.info(f"WebSocket connection closed with code: {close_code}")
-        for task in self.tasks:
-            task.cancel()
-
-    def create_background_tasks(self):
-        tasks = [
-            asyncio.create_task(self.update_loop("update_attack_movements")),
-            asyncio.create_task(self.update_loop("update_resources")),
-            asyncio.create_task(self.update_loop("update_centers_of_mass")),
-            asyncio.create_task(self.update_loop("get_new_attack_movements")),
-            asyncio.create_task(self.update_loop("update_square_areas")),
-            asyncio.create_task(self.update_loop("update_neighbors")),
-            asyncio.create_task(self.send_grid_update()),
-            asyncio.create_task(self.send_square_info()),
-            asyncio.create_task(self.log_average_execution_times()),
+        SquareConsumer.connected_clients.discard(self)
+        if not SquareConsumer.connected_clients:
+            for task in SquareConsumer.tasks:
+                task.cancel()
+            SquareConsumer.tasks = []
+            SquareConsumer.game = None
+            SquareConsumer.prev_grid = None
+            SquareConsumer.idx_buffers = None
+            SquareConsumer.square_info_cache = {}
+
+    @classmethod
+    def create_background_tasks(cls):
+        return [asyncio.create_task(cls.scheduler())]
+
+    @classmethod
+    def scheduled_jobs(cls):
+        game = cls.game
+        return [
+            ("update_attack_movements", cls.UPDATE_INTERVALS["attack_movements"], game.update_attack_movements),
+            ("update_resources", cls.UPDATE_INTERVALS["resources"], game.update_resources),
+            ("update_centers_of_mass", cls.UPDATE_INTERVALS["centers_of_mass"], game.update_centers_of_mass),
+            ("get_new_attack_movements", cls.UPDATE_INTERVALS["new_attack_movements"], game.get_new_attack_movements),
+            ("update_square_areas", cls.UPDATE_INTERVALS["square_areas"], game.update_square_areas),
+            ("update_neighbors", cls.UPDATE_INTERVALS["neighbors"], game.update_neighbors),
+            ("send_grid_update", cls.UPDATE_INTERVALS["grid_update"], cls._send_grid_update),
+            ("send_square_info", cls.UPDATE_INTERVALS["square_info"], cls._send_square_info),
+            ("log_execution_times", cls.LOG_INTERVAL, cls.log_execution_times),
         ]
-        return tasks
-
-    async def update_loop(self, method_name):
-        while True:
-            try:
-                await self.timed_execution(method_name, getattr(self.game, method_name))
-                await asyncio.sleep(self.UPDATE_INTERVALS[method_name.split("_", 1)[1]])
-            except Exception as e:
-                self.log_error(method_name, e)
-                break
 
-    async def send_grid_update(self):
+    @classmethod
+    async def scheduler(cls):
+        """Drive all periodic jobs from one task, sleeping until the next due time."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        heap = [(now + interval, name, interval, func) for name, interval, func in cls.scheduled_jobs()]
+        heapq.heapify(heap)
         while True:
+            due, name, interval, func = heapq.heappop(heap)
+            delay = due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
             try:
-                await self.timed_execution("send_grid_update", self._send_grid_update)
+                await cls.timed_execution(name, func)
             except Exception as e:
-                self.log_error("send_grid_update", e)
-            await asyncio.sleep(self.UPDATE_INTERVALS["grid_update"])
-
-    async def send_square_info(self):
-        while True:
-            try:
-                await self.timed_execution("send_square_info", self._send_square_info)
-            except Exception as e:
-                self.log_error("send_square_info", e)
-            await asyncio.sleep(self.UPDATE_INTERVALS["square_info"])
+                cls.log_error(name, e)
+            heapq.heappush(heap, (loop.time() + interval, name, interval, func))
+
+    @classmethod
+    async def broadcast(cls, payload: bytes):
+        clients = list(cls.connected_clients)
+        if not clients:
+            return
+        send_tasks = [asyncio.create_task(client.send(bytes_data=payload)) for client in clients]
+        _, pending = await asyncio.wait(send_tasks, timeout=cls.BROADCAST_TIMEOUT)
+        for client, task in zip(clients, send_tasks):
+            if task in pending:
+                task.cancel()
+                cls.connected_clients.discard(client)
+                # Close the socket so the client sees the eviction and can reconnect,
+                # instead of staring at a frozen game on a half-dead connection
+                try:
+                    await client.close()
+                except Exception as e:
+                    cls.log_error("broadcast", e)
+                logger.warning("Evicted client that could not keep up with the broadcast rate")
 
     async def send_map(self):
         try:
-            await self.timed_execution("send_map", self._send_map)
+            await SquareConsumer.timed_execution("send_map", self._send_map)
             logger.info("Map sent successfully")
         except Exception as e:
-            self.log_error("send_map", e)
+            SquareConsumer.log_error("send_map", e)
 
-    async def timed_execution(self, name, func):
+    @classmethod
+    async def timed_execution(cls, name, func):
         start_time = time.time()
         await func() if asyncio.iscoroutinefunction(func) else func()
         execution_time = time.time() - start_time
-        self.execution_times[name].append(execution_time)
+        cls.execution_times[name].append(execution_time)
 
-    def log_error(self, method_name, error):
+    @classmethod
+    def log_error(cls, method_name, error):
         logger.error(f"Error in {method_name}: {str(error)}", exc_info=True)
         logger.error(f"Traceback: {traceback.format_exc()}")
 
-    async def log_average_execution_times(self):
-        while True:
-            await asyncio.sleep(self.LOG_INTERVAL)
-            log_message = "Average execution times:\n"
-            for name, times in self.execution_times.items():
-                if times:
-                    total_time = sum(times)
-                    log_message += f"{name}: {total_time:.4f} seconds\n"
-                    # Clear the times after logging
-                    self.execution_times[name] = []
-            logger.info(log_message)
-
-    async def _send_square_info(self):
-        square_info = [
-            SquareInfo(id=square.id, resources=square.resources, center_of_mass=square.center_of_mass) for square in self.game.state.squares
-        ]
-        message = SquareInfoMessage(square_info=square_info)
-        await self.send(text_data=message.model_dump_json())
+    @classmethod
+    def log_execution_times(cls):
+        log_message = "Average execution times:\n"
+        for name, times in cls.execution_times.items():
+            if times:
+                total_time = sum(times)
+                log_message += f"{name}: {total_time:.4f} seconds\n"
+                # Clear the times after logging
+                cls.execution_times[name] = []
+        logger.info(log_message)
+
+    @classmethod
+    async def _send_square_info(cls):
+        # Most squares don't change between ticks; reuse their serialized fragments
+        fragments = []
+        live_ids = set()
+        for square in cls.game.state.squares:
+            live_ids.add(square.id)
+            key = (square.resources, square.center_of_mass)
+            cached = cls.square_info_cache.get(square.id)
+            if cached is None or cached[0] != key:
+                info = SquareInfo(id=square.id, resources=square.resources, center_of_mass=square.center_of_mass)
+                cached = (key, SQUARE_INFO_ADAPTER.dump_json(info))
+                cls.square_info_cache[square.id] = cached
+            fragments.append(cached[1])
+        for dead_id in set(cls.square_info_cache) - live_ids:
+            del cls.square_info_cache[dead_id]
+        payload = b'{"type":"square_info","square_info":[' + b",".join(fragments) + b"]}"
+        await cls.broadcast(SQUARE_INFO_FRAME + payload)
 
     async def _send_map(self):
-        color_grid = self.game.map.get_color_map()
-        flat_grid = color_grid.flatten().astype(np.uint8).tobytes()
-        compressed_grid = zlib.compress(flat_grid)
-        map_message = MapMessage(grid=compressed_grid.hex())
-        await self.send(text_data=map_message.model_dump_json())
-
-    async def _send_grid_update(self):
-        color_grid = self.game.get_color_grid()
-        flat_grid = color_grid.flatten().astype(np.uint8).tobytes()
-        compressed_grid = zlib.compress(flat_grid)
-        grid_update = GridUpdateMessage(grid=compressed_grid.hex())
-        await self.send(text_data=grid_update.model_dump_json())
+        color_grid = SquareConsumer.game.map.get_color_map()
+        # The color map is already C-contiguous uint8; tobytes() is the only copy needed
+        flat_grid = np.ascontiguousarray(color_grid).tobytes()
+        # One-shot compression here: the shared compressor context must not be used
+        # from two threads at once, and connects are rare anyway
+        compressed_grid = await asyncio.to_thread(zstd.compress, flat_grid, 1)
+        await self.send(bytes_data=MAP_FRAME + compressed_grid)
+        palette = {square.id: square.color[0].tolist() for square in SquareConsumer.game.state.squares}
+        await self.send(bytes_data=PALETTE_FRAME + json.dumps(palette).encode())
+        # Late joiners need a keyframe matching the delta stream's reference grid
+        if SquareConsumer.prev_grid is not None:
+            compressed_grid = await asyncio.to_thread(zstd.compress, SquareConsumer.prev_grid.tobytes(), 1)
+            await self.send(bytes_data=GRID_UPDATE_FRAME + compressed_grid)
+
+    @classmethod
+    async def _send_grid_update(cls):
+        # Square ids fit in one byte (unowned cells are 0, inaccessible cells wrap to 255),
+        # so grids travel as palette indices at a quarter of the RGBA size
+        grid = cls.game.state.grid
+        if cls.idx_buffers is None:
+            cls.idx_buffers = (np.empty(grid.shape, np.uint8), np.empty(grid.shape, np.uint8))
+        # Write into whichever buffer prev_grid is not holding as the keyframe
+        idx_grid = cls.idx_buffers[1] if cls.idx_buffers[0] is cls.prev_grid else cls.idx_buffers[0]
+        np.copyto(idx_grid, grid, casting="unsafe")
+        now = time.time()
+        if cls.prev_grid is None or now - cls.last_keyframe_time >= cls.KEYFRAME_INTERVAL:
+            compressed_grid = await asyncio.to_thread(cls.compressor.compress, idx_grid.tobytes())
+            await cls.broadcast(GRID_UPDATE_FRAME + compressed_grid)
+            cls.prev_grid = idx_grid
+            cls.last_keyframe_time = now
+            return
+        changed = idx_grid != cls.prev_grid
+        if not changed.any():
+            return
+        indices = np.argwhere(changed)
+        deltas = np.empty(len(indices), dtype=DELTA_DTYPE)
+        deltas["y"] = indices[:, 0]
+        deltas["x"] = indices[:, 1]
+        deltas["id"] = idx_grid[changed]
+        compressed_deltas = await asyncio.to_thread(cls.compressor.compress, deltas.tobytes())
+        await cls.broadcast(GRID_DELTA_FRAME + compressed_deltas)
+        cls.prev_grid = idx_grid
@@ -1,11 +1,72 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from pydantic import PlainSerializer, BeforeValidator
+from dataclasses import dataclass
 from functools import partial
 
 from typing import Annotated
 import random
 import numpy as np
-from scipy.signal import convolve2d
+from numba import njit
+
+
+def _dilate_plus(mask: np.ndarray) -> np.ndarray:
+    """4-neighborhood dilation of a bool mask via shifted ORs (no kernel machinery)."""
+    dilated = np.zeros_like(mask)
+    dilated[1:, :] |= mask[:-1, :]
+    dilated[:-1, :] |= mask[1:, :]
+    dilated[:, 1:] |= mask[:, :-1]
+    dilated[:, :-1] |= mask[:, 1:]
+    return dilated
+
+
+@njit(cache=True)
+def _expand_border(border_pixels: np.ndarray, grid: np.ndarray, target: int) -> np.ndarray:
+    """Collect the unique target-owned pixels 4-adjacent to (or on) the border, in one fused pass."""
+    height, width = grid.shape
+    keys = np.empty(border_pixels.shape[0] * 5, dtype=np.int64)
+    count = 0
+    for i in range(border_pixels.shape[0]):
+        y = border_pixels[i, 0]
+        x = border_pixels[i, 1]
+        if grid[y, x] == target:
+            keys[count] = y * width + x
+            count += 1
+        if y > 0 and grid[y - 1, x] == target:
+            keys[count] = (y - 1) * width + x
+            count += 1
+        if y < height - 1 and grid[y + 1, x] == target:
+            keys[count] = (y + 1) * width + x
+            count += 1
+        if x > 0 and grid[y, x - 1] == target:
+            keys[count] = y * width + x - 1
+            count += 1
+        if x < width - 1 and grid[y, x + 1] == target:
+            keys[count] = y * width + x + 1
+            count += 1
+    unique_keys = np.unique(keys[:count])
+    next_pixels = np.empty((unique_keys.shape[0], 2), dtype=np.int64)
+    for i in range(unique_keys.shape[0]):
+        next_pixels[i, 0] = unique_keys[i] // width
+        next_pixels[i, 1] = unique_keys[i] % width
+    return next_pixels
+
+
+@njit(cache=True)
+def _compute_costs(num_pixels: int, target_resources: int, target_area: int, target_max_resources: int, investment: int) -> tuple:
+    base_cost = num_pixels * (target_resources / target_area)
+    resource_ratio = target_resources / target_max_resources
+    cost_multiplier = 1 + resource_ratio
+    source_cost = int(2 * base_cost * cost_multiplier)
+    target_cost = int(base_cost * cost_multiplier)
+    source_cost = min(source_cost, investment)
+    target_cost = min(target_cost, target_resources)
+    if source_cost < 2 * target_cost:
+        target_cost = source_cost // 2
+    elif source_cost > 2 * target_cost:
+        source_cost = 2 * target_cost
+    if source_cost < num_pixels:
+        source_cost = num_pixels
+    return source_cost, target_cost
 
 
 class NumpyArray:
@@ -13,7 +74,8 @@ class NumpyArray:
 
     @staticmethod
     def validate(value, dtype):
-        return np.array(value, dtype=dtype)
+        # No-op for ndarrays that already have the right dtype, instead of always copying
+        return np.asarray(value, dtype=dtype)
 
     @staticmethod
     def serialize(value):
@@ -24,7 +86,13 @@ class NumpyArray:
         return Annotated[np.ndarray, PlainSerializer(cls.serialize), BeforeValidator(validate)]
 
 
-class AttackMovement(BaseModel):
+@dataclass(slots=True)
+class AttackMovement:
+    """Kept as a plain slots dataclass: instances are created every tick, and pydantic
+    validation only applies when one crosses the GameState (de)serialization boundary."""
+
+    __pydantic_config__ = ConfigDict(arbitrary_types_allowed=True)
+
     source: int
     target: int
     investment: int
@@ -38,52 +106,19 @@ class AttackMovement(BaseModel):
     def find_start_pixels(self, grid: np.ndarray) -> np.ndarray:
         own = grid == self.source
         target = grid == self.target
-        kernel = np.array([[0, 1, 0], [1, 0, 1], [0, 1, 0]])
-        adjacent = convolve2d(own, kernel, mode="same", boundary="fill")
-        result = np.logical_and(target, adjacent > 0)
+        adjacent = _dilate_plus(own)
+        result = np.logical_and(target, adjacent)
         indices = np.argwhere(result)
         return indices
 
     def get_next_pixels(self, grid: np.ndarray) -> np.ndarray:
-        offsets = np.array([[0, 0], [-1, 0], [1, 0], [0, -1], [0, 1]])
-        bordering_pixels = np.unique(np.array([self.border_pixels + offset for offset in offsets]).reshape(-1, 2), axis=0)
-        valid_pixels = np.all(np.logical_and(bordering_pixels >= 0, bordering_pixels < grid.shape), axis=1)
-        bordering_pixels = bordering_pixels[valid_pixels]
-        bordering_pixels = bordering_pixels[grid[bordering_pixels[:, 0], bordering_pixels[:, 1]] == self.target]
-        return bordering_pixels
+        return _expand_border(np.ascontiguousarray(self.border_pixels), grid, self.target)
 
     def get_next_pixels_costs(self, next_pixels: np.ndarray, target: "Square") -> tuple[int, int]:
         num_pixels = len(next_pixels)
         if target is None:
             return num_pixels, num_pixels
-        # Base cost calculation
-        base_cost = num_pixels * (target.resources / target.area)
-
-        # Adjust cost based on target's resource ratio
-        resource_ratio = target.resources / target.max_resources
-        cost_multiplier = 1 + resource_ratio
-
-        # Calculate costs for source and target
-        source_cost = int(2 * base_cost * cost_multiplier)
-        target_cost = int(base_cost * cost_multiplier)
-
-        # Ensure costs don't exceed limits
-        source_cost = min(source_cost, self.investment)
-        target_cost = min(target_cost, target.resources)
-
-        # Ensure source cost is always twice the target cost
-        if source_cost < 2 * target_cost:
-            target_cost = source_cost // 2
-        elif source_cost > 2 * target_cost:
-            source_cost = 2 * target_cost
-
-        if source_cost < num_pixels:
-            source_cost = num_pixels
-
-        return source_cost, target_cost
-
-    class Config:
-        arbitrary_types_allowed = True
+        return _compute_costs(num_pixels, target.resources, target.area, target.max_resources, self.investment)
 
 
 class Square(BaseModel):
@@ -116,7 +151,7 @@ class Square(BaseModel):
     def get_new_attack_movement(self, neighbor_ids: set[int]) -> AttackMovement | None:
         if neighbor_ids and random.random() < 0.1:
             investment = int(random.uniform(0.01, 0.9) * self.resources)
-            target = random.choice(list(neighbor_ids))
+            target = int(random.choice(list(neighbor_ids)))
             attack_movement = AttackMovement(source=self.id, target=target, investment=investment)
             self.resources -= investment
             return attack_movement
@@ -133,8 +168,10 @@ class Square(BaseModel):
 class GameState(BaseModel):
     width: int
     height: int
-    grid: NumpyArray[int]
-    color_grid: NumpyArray[int]
+    # int16 holds every square id plus the -1 sentinel at a quarter of the
+    # bandwidth of the default int64 on full-grid scans
+    grid: NumpyArray[np.int16]
+    color_grid: NumpyArray[np.uint8]
     num_squares: int
     squares: list[Square]
     attack_movements: list[AttackMovement] = []
@@ -152,13 +189,3 @@ class SquareInfo(BaseModel):
 class SquareInfoMessage(BaseModel):
     type: str = "square_info"
     square_info: list[SquareInfo]
-
-
-class GridUpdateMessage(BaseModel):
-    type: str = "grid_update"
-    grid: str
-
-
-class MapMessage(BaseModel):
-    type: str = "map"
-    grid: str
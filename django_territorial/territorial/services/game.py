@@ -1,40 +1,71 @@
 import numpy as np
-from loguru import logger
+from numba import njit
 from territorial.models import GameState, Square, AttackMovement
 from territorial.services.map import Map
-from scipy.signal import convolve2d
-from collections import Counter
+from collections import defaultdict
+
+
+@njit(cache=True)
+def _grid_stats(grid: np.ndarray, max_id: int) -> tuple:
+    """Areas and coordinate sums for every square id, fused into a single grid pass."""
+    areas = np.zeros(max_id + 1, dtype=np.int64)
+    sum_y = np.zeros(max_id + 1, dtype=np.float64)
+    sum_x = np.zeros(max_id + 1, dtype=np.float64)
+    for y in range(grid.shape[0]):
+        for x in range(grid.shape[1]):
+            square_id = grid[y, x]
+            if square_id < 1 or square_id > max_id:
+                continue
+            areas[square_id] += 1
+            sum_y[square_id] += y
+            sum_x[square_id] += x
+    return areas, sum_y, sum_x
+
+
+@njit(cache=True)
+def _apply_capture(grid: np.ndarray, color_grid: np.ndarray, pixels: np.ndarray, square_id: int, color: np.ndarray) -> None:
+    """Write captured pixels into the id grid and the color grid in one fused pass."""
+    for i in range(pixels.shape[0]):
+        y = pixels[i, 0]
+        x = pixels[i, 1]
+        grid[y, x] = square_id
+        for c in range(color_grid.shape[2]):
+            color_grid[y, x, c] = color[0, c]
 
 
 class Game:
-    def __init__(self, width: int = 600, height: int = 400, num_squares: int = 200):
+    def __init__(self, width: int = 600, height: int = 400, num_squares: int = 200, game_map: Map | None = None):
         self.state: GameState = GameState(
             width=width,
             height=height,
-            grid=np.zeros((height, width), dtype=np.uint32),
+            grid=np.zeros((height, width), dtype=np.int16),
             num_squares=num_squares,
             squares=[],
             color_grid=np.zeros((height, width, 4), dtype=np.uint8),
         )
-        self.map = Map(width, height)
+        self.map = game_map if game_map is not None else Map(width, height)
         self.state.grid[~self.map.get_accessibility_mask()] = -1
+        # Computed once: every create_random_square call draws from the same mask
+        self._accessible_indices = np.argwhere(self.state.grid != -1)
         self.state.squares = [self.create_random_square(i) for i in range(self.state.num_squares)]
         self.id_squares_map = {square.id: square for square in self.state.squares}
 
         self.neighbors = np.array([])
+        self._adjacency: dict[int, set[int]] = {}
+        self.grid_stats = None
+        self.grid_stats_dirty = True
+        # Bumped on every capture; lets neighbor detection skip unchanged grids
+        self._grid_version = 0
+        self._neighbors_version = -1
+        # (source, target) -> movement, so collision handling needs no list scan
+        self._movement_index: dict[tuple[int, int], AttackMovement] = {}
 
     def create_random_square(self, square_id: int) -> Square:
         color = np.random.randint(0, 256, (1, 4), dtype=np.uint8)
         color[0, 3] = 125  # Set alpha to 125
 
-        # Create a mask of accessible positions
-        accessible_mask = self.state.grid != -1
-
-        # Get the indices of accessible positions
-        accessible_indices = np.argwhere(accessible_mask)
-
-        # Randomly choose a starting position from accessible positions
-        start_y, start_x = accessible_indices[np.random.randint(len(accessible_indices))]
+        # Randomly choose a starting position from the cached accessible positions
+        start_y, start_x = self._accessible_indices[np.random.randint(len(self._accessible_indices))]
 
         square = Square(
             id=square_id + 1,
@@ -50,19 +81,36 @@ class Game:
         return None
 
     def capture_pixels(self, pixels: np.ndarray, square: Square):
-        self.state.grid[pixels[:, 0], pixels[:, 1]] = square.id
-        self.state.color_grid[pixels[:, 0], pixels[:, 1]] = square.color
+        _apply_capture(self.state.grid, self.state.color_grid, np.ascontiguousarray(pixels), square.id, square.color)
+        self.grid_stats_dirty = True
+        self._grid_version += 1
+
+    def get_grid_stats(self) -> tuple:
+        """Cached per-square (areas, sum_y, sum_x), recomputed only after grid changes."""
+        if self.grid_stats is None or self.grid_stats_dirty:
+            self.grid_stats = _grid_stats(self.state.grid, self.state.num_squares)
+            self.grid_stats_dirty = False
+        return self.grid_stats
+
+    def _add_movement(self, movement: AttackMovement) -> None:
+        self.state.attack_movements.append(movement)
+        self._movement_index[(movement.source, movement.target)] = movement
+
+    def _remove_movement(self, movement: AttackMovement) -> None:
+        self.state.attack_movements.remove(movement)
+        self._movement_index.pop((movement.source, movement.target), None)
 
     def _update_attack_movement(self, attack_movement: AttackMovement) -> None:
         square = self.get_square_from_id(attack_movement.source)
         if square is None:
-            logger.error(f"Square with id {attack_movement.source} not found")
+            # The source square was eliminated; its movements die with it
+            self._remove_movement(attack_movement)
             return
         target = self.get_square_from_id(attack_movement.target)
         next_pixels = attack_movement.get_next_pixels(self.state.grid)
         if len(next_pixels) == 0:
             square.resources += attack_movement.investment
-            self.state.attack_movements.remove(attack_movement)
+            self._remove_movement(attack_movement)
             return
         self.capture_pixels(next_pixels, square)
         attack_movement.border_pixels = next_pixels
@@ -71,7 +119,7 @@ class Game:
         if target is not None:
             target.resources -= target_cost
         if attack_movement.investment <= 0:
-            self.state.attack_movements.remove(attack_movement)
+            self._remove_movement(attack_movement)
             return
 
     def update_attack_movements(self) -> list[tuple[int, int, str]]:
@@ -81,26 +129,24 @@ class Game:
             self._update_attack_movement(attack_movement)
 
     def handle_movement_collisions(self, new_movement: AttackMovement) -> None:
-        for movement in self.state.attack_movements:
-            if movement.source == new_movement.source and movement.target == new_movement.target:
-                movement.investment += new_movement.investment
-                return
-            if movement.source == new_movement.target and movement.target == new_movement.source:
-                min_investment = min(new_movement.investment, movement.investment)
-                new_movement.investment -= min_investment
-                movement.investment -= min_investment
-                if new_movement.investment > 0:
-                    self.state.attack_movements.append(new_movement)
-                if movement.investment <= 0:
-                    self.state.attack_movements.remove(movement)
-                return
-        self.state.attack_movements.append(new_movement)
-
-    def get_neighbors(self, square_id: int) -> np.ndarray:
-        if self.neighbors.size == 0:
-            return np.array([])
-        targets = self.neighbors[np.any(self.neighbors == square_id, axis=1)]
-        return np.unique(targets[targets != square_id])
+        existing = self._movement_index.get((new_movement.source, new_movement.target))
+        if existing is not None:
+            existing.investment += new_movement.investment
+            return
+        reverse = self._movement_index.get((new_movement.target, new_movement.source))
+        if reverse is not None:
+            min_investment = min(new_movement.investment, reverse.investment)
+            new_movement.investment -= min_investment
+            reverse.investment -= min_investment
+            if new_movement.investment > 0:
+                self._add_movement(new_movement)
+            if reverse.investment <= 0:
+                self._remove_movement(reverse)
+            return
+        self._add_movement(new_movement)
+
+    def get_neighbors(self, square_id: int) -> set[int]:
+        return self._adjacency.get(square_id, set())
 
     def update_resources(self) -> None:
         for square in self.state.squares:
@@ -108,24 +154,32 @@ class Game:
 
     def get_new_attack_movements(self) -> None:
         for square in self.state.squares:
-            square_neighbors = self.get_neighbors(square.id)
-            new_movement = square.get_new_attack_movement(set(square_neighbors))
+            # A square this broke can only produce a zero-investment movement
+            if square.resources < 2:
+                continue
+            new_movement = square.get_new_attack_movement(self.get_neighbors(square.id))
             if new_movement:
                 self.handle_movement_collisions(new_movement)
 
     def update_centers_of_mass(self) -> None:
+        areas, sum_y, sum_x = self.get_grid_stats()
         for square in self.state.squares:
-            square.update_center_of_mass(self.state.grid)
+            area = areas[square.id]
+            if area == 0:
+                continue
+            square.center_of_mass = (sum_y[square.id] / area, sum_x[square.id] / area)
 
     def update_square_areas(self) -> None:
-        flatten_grid = self.state.grid.flatten()
-        value_counts = dict(Counter(flatten_grid))
+        areas, _, _ = self.get_grid_stats()
 
+        survivors = []
         for square in self.state.squares:
-            if square.id not in value_counts.keys():
-                self.state.squares.remove(square)
-            else:
-                square.area = value_counts[square.id]
+            if areas[square.id] == 0:
+                continue
+            square.area = int(areas[square.id])
+            survivors.append(square)
+        self.state.squares = survivors
+        self.id_squares_map = {square.id: square for square in survivors}
 
     def get_color_grid(self) -> np.ndarray:
         return self.state.color_grid
@@ -133,37 +187,34 @@ class Game:
     def find_all_possible_targets(self) -> np.ndarray:
         grid = self.state.grid
 
-        kernels = [
-            np.array([[0, 1, 0], [0, 0, 0], [0, 0, 0]]),  # up
-            np.array([[0, 0, 0], [0, 0, 1], [0, 0, 0]]),  # right
-        ]
-
-        # List to collect all pairs
-        all_pairs = []
-
-        # Perform convolution for each direction
-        for kernel in kernels:
-            convolved = convolve2d(grid, kernel, mode="same", boundary="fill", fillvalue=0)
+        # Pack each ordered pair into one int64 key so dedup runs on a flat
+        # array instead of row-wise np.unique over an (N, 2) table
+        all_keys = []
 
-            # Find indices where convolution has non-zero elements
-            mask = convolved != 0
-            source_ids = grid[mask]
-            target_ids = convolved[mask]
+        # Each adjacency is a pair of shifted views of the grid; no convolution needed
+        for source_ids, target_ids in ((grid[:-1, :], grid[1:, :]), (grid[:, 1:], grid[:, :-1])):
+            mask = target_ids != 0
+            a = source_ids[mask].astype(np.int64)
+            b = target_ids[mask].astype(np.int64)
+            low = np.minimum(a, b)
+            high = np.maximum(a, b)
 
-            # Collect pairs and sort them for uniqueness
-            pairs = np.column_stack((source_ids, target_ids))
-            pairs = np.unique(pairs, axis=0)
-            pairs = np.sort(pairs, axis=1)
-            all_pairs.append(pairs)
+            # Filter out unaccessible positions (low is -1 iff either id is)
+            valid = low != -1
+            all_keys.append((low[valid] << 16) | high[valid])
 
-        # Stack all pairs and find unique ones
-        all_pairs = np.vstack(all_pairs)
-        unique_pairs = np.unique(all_pairs, axis=0)
-
-        # Filter out unaccessible positions
-        unique_pairs = unique_pairs[(unique_pairs[:, 0] != -1) & (unique_pairs[:, 1] != -1)]
-
-        return unique_pairs
+        unique_keys = np.unique(np.concatenate(all_keys))
+        return np.column_stack((unique_keys >> 16, unique_keys & 0xFFFF)).astype(grid.dtype)
 
     def update_neighbors(self) -> None:
+        if self._grid_version == self._neighbors_version:
+            return
         self.neighbors = self.find_all_possible_targets()
+        self._neighbors_version = self._grid_version
+        adjacency: dict[int, set[int]] = defaultdict(set)
+        for a, b in self.neighbors:
+            a, b = int(a), int(b)
+            if a != b:
+                adjacency[a].add(b)
+                adjacency[b].add(a)
+        self._adjacency = adjacency
@@ -1,6 +1,6 @@
 import Canvas from './Canvas.js';
 import { setupWebSocket } from '../utils/websocket.js';
-import { applyMap, updateGraphics, updateSquareInfo } from '../utils/pixiHelpers.js';
+import { applyMap, applyPalette, updateGraphics, applyGridDelta, updateSquareInfo } from '../utils/pixiHelpers.js';
 
 const { useEffect, useState, createElement } = React;
 
@@ -19,14 +19,27 @@ export default function App() {
         }
     }, [app]);  // Only set up WebSocket after app is initialized
 
+    const MAP_FRAME = 1;
+    const GRID_UPDATE_FRAME = 2;
+    const GRID_DELTA_FRAME = 3;
+    const SQUARE_INFO_FRAME = 4;
+    const PALETTE_FRAME = 5;
+    const textDecoder = new TextDecoder();
+
     const handleSocketMessage = (e) => {
-        const data = JSON.parse(e.data);
-        if (data.type === 'map') {
-            applyMap(app, data.grid);
-        } else if (data.type === 'square_info') {
-            updateSquareInfo(app, data.square_info);
-        } else if (data.type === 'grid_update') {
-            updateGraphics(app, data.grid);
+        if (!(e.data instanceof ArrayBuffer)) return;
+        const frame = new Uint8Array(e.data);
+        const payload = frame.subarray(1);
+        if (frame[0] === MAP_FRAME) {
+            applyMap(app, payload);
+        } else if (frame[0] === GRID_UPDATE_FRAME) {
+            updateGraphics(app, payload);
+        } else if (frame[0] === GRID_DELTA_FRAME) {
+            applyGridDelta(app, payload);
+        } else if (frame[0] === PALETTE_FRAME) {
+            applyPalette(app, payload);
+        } else if (frame[0] === SQUARE_INFO_FRAME) {
+            updateSquareInfo(app, JSON.parse(textDecoder.decode(payload)).square_info);
         }
     };
 
@@ -2,31 +2,72 @@ export function applyMap(app, data) {
     if (!app || !app.stage) return;
     const graphics = app.stage.getChildAt(0).getChildAt(0);
     graphics.clear();
-    const gridData = new Uint8Array(data.match(/.{1,2}/g).map(byte => parseInt(byte, 16)));
-    const imageData = pako.inflate(gridData);
+    const imageData = fzstd.decompress(data);
     const mapTexture = PIXI.Texture.fromBuffer(imageData, 600, 400);
     const mapSprite = new PIXI.Sprite(mapTexture);
     graphics.addChild(mapSprite);
     mapSprite.position.set(0, 0);
 }
 
+export function applyPalette(app, payload) {
+    if (!app || !app.stage) return;
+    const graphics = app.stage.getChildAt(0).getChildAt(0);
+    // 256 RGBA entries; ids without a palette entry (unowned, walls) stay transparent
+    const palette = new Uint8Array(256 * 4);
+    const colors = JSON.parse(new TextDecoder().decode(payload));
+    for (const [id, rgba] of Object.entries(colors)) {
+        palette.set(rgba, id * 4);
+    }
+    graphics.palette = palette;
+}
+
 export function updateGraphics(app, gridBuffer) {
     if (!app || !app.stage) return;
     const graphics = app.stage.getChildAt(0).getChildAt(0);
-    graphics.clear();
-    const gridData = new Uint8Array(gridBuffer.match(/.{1,2}/g).map(byte => parseInt(byte, 16)));
-    const imageData = pako.inflate(gridData);
-    const updateTexture = PIXI.Texture.fromBuffer(imageData, 600, 400);
+    if (!graphics.palette) return;  // No palette received yet
+    const ids = fzstd.decompress(gridBuffer);
 
     if (!graphics.sprite) {
-        const sprite = new PIXI.Sprite(updateTexture);
+        graphics.imageData = new Uint8Array(600 * 400 * 4);
+        const sprite = new PIXI.Sprite(PIXI.Texture.fromBuffer(graphics.imageData, 600, 400));
         graphics.sprite = sprite;
         graphics.addChild(sprite);
         sprite.position.set(0, 0);
-    } else {
-        graphics.sprite.texture = updateTexture;
-        graphics.sprite.texture.update();
     }
+    const imageData = graphics.imageData;
+    const palette = graphics.palette;
+    for (let i = 0; i < ids.length; i++) {
+        const p = i * 4;
+        const q = ids[i] * 4;
+        imageData[p] = palette[q];
+        imageData[p + 1] = palette[q + 1];
+        imageData[p + 2] = palette[q + 2];
+        imageData[p + 3] = palette[q + 3];
+    }
+    graphics.sprite.texture.update();
+}
+
+export function applyGridDelta(app, deltaBuffer) {
+    if (!app || !app.stage) return;
+    const graphics = app.stage.getChildAt(0).getChildAt(0);
+    if (!graphics.sprite || !graphics.palette) return;  // No keyframe received yet
+
+    // Each record is 5 bytes: y (u16 LE), x (u16 LE), palette id (u8)
+    const deltas = fzstd.decompress(deltaBuffer);
+    const view = new DataView(deltas.buffer, deltas.byteOffset, deltas.byteLength);
+    const imageData = graphics.imageData;
+    const palette = graphics.palette;
+    for (let i = 0; i < deltas.length; i += 5) {
+        const y = view.getUint16(i, true);
+        const x = view.getUint16(i + 2, true);
+        const p = (y * 600 + x) * 4;
+        const q = deltas[i + 4] * 4;
+        imageData[p] = palette[q];
+        imageData[p + 1] = palette[q + 1];
+        imageData[p + 2] = palette[q + 2];
+        imageData[p + 3] = palette[q + 3];
+    }
+    graphics.sprite.texture.update();
 }
 
 export function updateSquareInfo(app, squareInfo) {
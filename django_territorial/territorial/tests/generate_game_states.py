@@ -1,9 +1,11 @@
-import json
+import heapq
 import sys
 import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+import orjson
 import random
+import numpy as np
 from territorial.services.game import Game
 from territorial.consumers import SquareConsumer
 from tqdm import tqdm
@@ -29,9 +31,6 @@ def generate_game_states(num_states=50):
         players_to_remove = n_players - play_until_remaining
         current_time = 0
 
-        # Initialize last update times
-        last_update = {key: 0 for key in SquareConsumer.UPDATE_INTERVALS.keys()}
-
         # Map update types to their corresponding game methods
         update_methods = {
             "attack_movements": game.update_attack_movements,
@@ -41,17 +40,22 @@ def generate_game_states(num_states=50):
             "square_areas": game.update_square_areas,
             "neighbors": game.update_neighbors,
         }
+        # Due-time heap mirroring the consumer's scheduler: each iteration jumps
+        # straight to the next due update instead of polling every interval on a
+        # fixed 100ms tick
+        heap = [
+            (interval, interval, update_type)
+            for update_type, interval in SquareConsumer.UPDATE_INTERVALS.items()
+            if update_type in update_methods
+        ]
+        heapq.heapify(heap)
         eliminated = 0
         with tqdm(total=players_to_remove, desc="Simulating game", leave=False) as pbar:
             while len(game.state.squares) > play_until_remaining:
-                current_time += 0.1  # Increment by 100ms each iteration
-
-                # Check which updates should occur based on their intervals
-                for update_type, interval in SquareConsumer.UPDATE_INTERVALS.items():
-                    if current_time - last_update[update_type] >= interval:
-                        if update_type in update_methods:
-                            update_methods[update_type]()
-                            last_update[update_type] = current_time
+                due, interval, update_type = heapq.heappop(heap)
+                current_time = due
+                update_methods[update_type]()
+                heapq.heappush(heap, (due + interval, interval, update_type))
                 if len(game.state.squares) < n_players - eliminated:
                     new_eliminated = n_players - eliminated - len(game.state.squares)
                     eliminated += new_eliminated
@@ -68,8 +72,9 @@ def generate_game_states(num_states=50):
 
 def save_game_states(game_states, filename=os.path.join(os.path.dirname(__file__), GAME_STATES_FILE)):
     logger.info(f"Saving {len(game_states)} game states to {filename}")
-    with open(filename, "w") as f:
-        f.write(json.dumps(game_states))
+    with open(filename, "wb") as f:
+        # model_dump leaves numpy scalars (centers of mass) in the states
+        f.write(orjson.dumps(game_states, option=orjson.OPT_SERIALIZE_NUMPY))
     logger.success(f"Game states saved successfully to {filename}")
 
 
@@ -79,14 +84,12 @@ if __name__ == "__main__":
     save_game_states(states)
     logger.success(f"50 game states have been generated and saved to '{GAME_STATES_FILE}'")
 
-    # Print some statistics about the generated states
-    widths = [state["width"] for state in states]
-    heights = [state["height"] for state in states]
-    num_squares = [len(state["squares"]) for state in states]
-    num_attacks = [len(state["attack_movements"]) for state in states]
+    # Print some statistics about the generated states, collected in one pass
+    stats = np.array([(state["width"], state["height"], len(state["squares"]), len(state["attack_movements"])) for state in states])
+    widths, heights, num_squares, num_attacks = stats.T
 
     logger.info("Statistics of generated game states:")
-    logger.info(f"Width range: {min(widths)} to {max(widths)}")
-    logger.info(f"Height range: {min(heights)} to {max(heights)}")
-    logger.info(f"Number of squares range: {min(num_squares)} to {max(num_squares)}")
-    logger.info(f"Number of active attacks range: {min(num_attacks)} to {max(num_attacks)}")
+    logger.info(f"Width range: {widths.min()} to {widths.max()}")
+    logger.info(f"Height range: {heights.min()} to {heights.max()}")
+    logger.info(f"Number of squares range: {num_squares.min()} to {num_squares.max()}")
+    logger.info(f"Number of active attacks range: {num_attacks.min()} to {num_attacks.max()}")
@@ -2,14 +2,17 @@ import sys
 import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
-import zlib
 import time
 import json
-from functools import wraps
+import orjson
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, wraps
 import numpy as np
+import zstandard as zstd
 from territorial.services.game import Game
-from territorial.consumers import SquareConsumer
-from territorial.models import GridUpdateMessage, GameState
+from territorial.services.map import Map
+from territorial.consumers import SquareConsumer, GRID_UPDATE_FRAME
+from territorial.models import GameState
 from tqdm import tqdm
 from loguru import logger
 
@@ -17,8 +20,8 @@ GAME_STATES_FILE = "game_states.json"
 
 
 def load_game_states():
-    with open(os.path.join(os.path.dirname(__file__), GAME_STATES_FILE), "r") as f:
-        game_states_data = json.load(f)
+    with open(os.path.join(os.path.dirname(__file__), GAME_STATES_FILE), "rb") as f:
+        game_states_data = orjson.loads(f.read())
     return [GameState(**data) for data in game_states_data]
 
 
@@ -34,6 +37,10 @@ def cpu_time(func):
 
 
 class GamePerformanceTester:
+    # Shared across frames like the consumer's compressor, so its context
+    # allocation is not measured on every send
+    compressor = zstd.ZstdCompressor(level=1)
+
     def __init__(self, game: Game):
         self.game = game
         self.performance_results = {}
@@ -61,13 +68,26 @@ class GamePerformanceTester:
 
     def send_grid_update(self):
         color_grid = self.game.get_color_grid()
-        flat_grid = color_grid.flatten().astype(np.uint8).tobytes()
-        compressed_grid = zlib.compress(flat_grid)
-        grid_update = GridUpdateMessage(grid=compressed_grid.hex())  # noqa
+        # The color grid is already C-contiguous uint8; tobytes() is the only copy needed
+        flat_grid = np.ascontiguousarray(color_grid).tobytes()
+        compressed_grid = self.compressor.compress(flat_grid)
+        payload = GRID_UPDATE_FRAME + compressed_grid  # noqa
+
+
+@lru_cache(maxsize=8)
+def _cached_map(width: int, height: int) -> Map:
+    return Map(width, height)
 
 
 def run_performance_test(game_state):
-    game = Game()
+    # The map only matters during Game.__init__ (the loaded state replaces
+    # everything derived from it), so reuse one per size instead of paying
+    # noise generation on all 50 iterations
+    game = Game(
+        width=game_state.width,
+        height=game_state.height,
+        game_map=_cached_map(game_state.width, game_state.height),
+    )
     game.state = game_state
     game.id_squares_map = {square.id: square for square in game.state.squares}
     tester = GamePerformanceTester(game)
@@ -82,12 +102,18 @@ def main():
         logger.error("No game states loaded. Exiting.")
         return
 
-    all_results = []
-
     logger.info("Running performance tests:")
-    for i, game_state in enumerate(tqdm(game_states, desc="Processing game states", unit="state")):
-        results = run_performance_test(game_state)
-        all_results.append(results)
+    # Each state is measured with process_time in its own worker, so results
+    # are unaffected by the workers running concurrently
+    with ProcessPoolExecutor() as executor:
+        all_results = list(
+            tqdm(
+                executor.map(run_performance_test, game_states),
+                total=len(game_states),
+                desc="Processing game states",
+                unit="state",
+            )
+        )
 
     # Calculate average results
     avg_results = {}
@@ -1,7 +1,9 @@
 from django.shortcuts import render
-from rest_framework.decorators import api_view
+from django.views.decorators.cache import cache_page
+from django.views.decorators.http import require_GET
 
 
-@api_view(["GET"])
+@require_GET
+@cache_page(60 * 60)
 def home_view(request):
     return render(request, "index.html")